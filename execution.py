@@ -9,51 +9,106 @@ ticker_mapping = {
     "S&P TSX": "sp-tsx-historical-annual-returns.csv"
 }
 
-import altair as alt
+from datetime import date
+import numpy as np
 import pandas as pd
 pd.options.display.float_format = '${:,.2f}'.format
 import streamlit as st
 from financial_calculation import calculate_required_monthly_investment
-from simulation import simulate_time_series, monte_carlo_accruing_wealth
+from simulation import simulate_time_series, monte_carlo_accruing_wealth, average_simulations
 
-def plot_results(data_df: pd.DataFrame) -> None:
-    monthly_amounts_df = pd.melt(
-        data_df.reset_index(names="Year"),
-        id_vars=["Year"],
-        value_vars=[
-            "Net Worth",
-            "Interest Made",
-            "Monthly Investment",
-            "Interest Made - Cumulative Sum",
-            "Monthly Investment - Cumulative Sum",
-        ],
-        var_name="Amount Type",
-        value_name="Amount",
-    )
-
-    criterion = monthly_amounts_df["Amount Type"].isin(
+@st.cache_data(max_entries=32, show_spinner=False)
+def build_results_chart_spec(data_df: pd.DataFrame, fire_objective: float) -> dict:
+    """
+    Build the Vega-Lite spec of the results chart, cached so unchanged results skip rebuilding its data.
+    """
+    amounts_df = data_df[
         [
             "Net Worth",
             "Interest Made - Cumulative Sum",
             "Monthly Investment - Cumulative Sum",
         ]
+    ]
+    # Long form built column by column, equivalent to pd.melt on these three columns
+    monthly_amounts_df = pd.DataFrame(
+        {
+            "Year": np.tile(amounts_df.index, len(amounts_df.columns)),
+            "Amount Type": np.repeat(amounts_df.columns, len(amounts_df)),
+            "Amount": amounts_df.to_numpy().ravel(order="F"),
+        }
     )
 
-    monthly_amounts_chart = (
-        alt.Chart(monthly_amounts_df[criterion])
-        .mark_line()
-        .encode(
-            x="Year:T",
-            y=alt.Y("Amount:Q", title="Financial Amount (in $)"),
-            color=alt.Color("Amount Type:N", title="Type of Amount"),
-        )
-    )
-    objective_line = (
-        alt.Chart(pd.DataFrame({"Amount": [st.session_state.get("fire_objective", 0)]}))
-        .mark_rule()
-        .encode(y="Amount:Q")
-    )
-    st.altair_chart(monthly_amounts_chart + objective_line, use_container_width=True)
+    return {
+        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
+        "data": {"values": monthly_amounts_df.to_dict("records")},
+        "layer": [
+            {
+                "mark": "line",
+                "encoding": {
+                    "x": {"field": "Year", "type": "temporal", "timeUnit": "utcyearmonth"},
+                    "y": {"field": "Amount", "type": "quantitative", "title": "Financial Amount (in $)"},
+                    "color": {"field": "Amount Type", "type": "nominal", "title": "Type of Amount"},
+                },
+            },
+            {
+                "data": {"values": [{"Amount": fire_objective}]},
+                "mark": "rule",
+                "encoding": {"y": {"field": "Amount", "type": "quantitative"}},
+            },
+        ],
+    }
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def build_monte_carlo_chart_spec(net_worth_df: pd.DataFrame, fire_objective: float) -> dict:
+    """
+    Build the Vega-Lite spec of the Monte Carlo net worth chart, one line per iteration.
+    """
+    return {
+        "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
+        "title": "Monte Carlo simulation of net worth over time",
+        "data": {"values": net_worth_df.to_dict("records")},
+        "layer": [
+            {
+                "mark": {"type": "line", "opacity": 0.2},
+                "encoding": {
+                    "x": {"field": "Year", "type": "temporal", "timeUnit": "utcyearmonth"},
+                    "y": {"field": "Net Worth", "type": "quantitative"},
+                    "detail": {"field": "Iteration", "type": "nominal"},
+                    "tooltip": [
+                        {"field": "Year", "type": "temporal", "timeUnit": "utcyearmonth"},
+                        {"field": "Net Worth", "type": "quantitative"},
+                        {"field": "Iteration", "type": "nominal"},
+                    ],
+                },
+            },
+            {
+                "data": {"values": [{"Objective": fire_objective}]},
+                "mark": "rule",
+                "encoding": {"y": {"field": "Objective", "type": "quantitative"}},
+            },
+        ],
+    }
+
+
+def plot_results(data_df: pd.DataFrame) -> None:
+    spec = build_results_chart_spec(data_df, st.session_state.get("fire_objective", 0))
+    st.vega_lite_chart(spec, use_container_width=True)
+
+
+def find_date_exceeding(data_df: pd.DataFrame, fire_objective: float, monotonic: bool = False):
+    """
+    Find the first date at which the net worth reaches the fire objective, or pd.NaT if it never does.
+    A monotonic (never decreasing) net worth is searched with a binary search.
+    """
+    net_worth = data_df["Net Worth"].to_numpy()
+    if monotonic:
+        position = np.searchsorted(net_worth, fire_objective)
+    else:
+        reached = net_worth >= fire_objective
+        position = reached.argmax() if reached.any() else len(net_worth)
+
+    return data_df.index[position] if position < len(net_worth) else pd.NaT
 
 
 def render_execution_tab():
@@ -98,21 +153,6 @@ def render_time_until_tab():
     """
     st.header("Time until objective is met")
 
-    base_monthly_investment = st.number_input(
-        "Monthly investment ($)",
-        step=10,
-        format="%d",
-        help="The amount of money you expect to invest each month.",
-    )
-    monthly_deposit_growth = st.number_input(
-        "Monthly investment growth (% per year)",
-        step=0.1,
-        help="Expected yearly growth of your monthly investment. As time goes on, you may be able to increase monthly contributions.",
-    )
-
-    st.session_state.base_monthly_investment = base_monthly_investment
-    st.session_state.monthly_deposit_growth = monthly_deposit_growth
-
     simulation_mode = st.radio(
         "Choose one of the following simulation.",
         options=[
@@ -127,17 +167,52 @@ def render_time_until_tab():
         help="Choose the simulation mode you want to use to simulate your path to FI. Monte Carlo gives you more of a realistic range of outcomes, while Fixed return rate gives you a simple and deterministic path based on the average return rate you expect.",
     )
 
-    if simulation_mode == "Fixed return rate":
-        expected_interest_rate = st.slider(
-            "Interest Rate (% per year) with no inflation",
-            min_value=0.0,
-            max_value=15.0,
+    if simulation_mode is None:
+        return
+
+    # The inputs are submitted together so the simulation only reruns once they are all set
+    with st.form("time_until_inputs"):
+        base_monthly_investment = st.number_input(
+            "Monthly investment ($)",
+            step=10,
+            format="%d",
+            help="The amount of money you expect to invest each month.",
+        )
+        monthly_deposit_growth = st.number_input(
+            "Monthly investment growth (% per year)",
             step=0.1,
-            value=7.0,
-            help=(
-                "Average yearly return expected on your investments. For a diversified portfolio of stocks and bonds, this typically ranges between 5% and 7%."
-            )
+            help="Expected yearly growth of your monthly investment. As time goes on, you may be able to increase monthly contributions.",
         )
+
+        if simulation_mode == "Fixed return rate":
+            expected_interest_rate = st.slider(
+                "Interest Rate (% per year) with no inflation",
+                min_value=0.0,
+                max_value=15.0,
+                step=0.1,
+                value=7.0,
+                help=(
+                    "Average yearly return expected on your investments. For a diversified portfolio of stocks and bonds, this typically ranges between 5% and 7%."
+                )
+            )
+        elif simulation_mode == "Monte Carlo":
+            ticker_option = st.selectbox(
+                "What index would you like to use in the simulation?",
+                ticker_mapping.keys()
+            )
+
+        submitted = st.form_submit_button("Simulate")
+
+    st.session_state.base_monthly_investment = base_monthly_investment
+    st.session_state.monthly_deposit_growth = monthly_deposit_growth
+
+    # Nothing is simulated until the inputs are submitted once, later reruns reuse the submitted values
+    if submitted:
+        st.session_state.time_until_submitted = True
+    if not st.session_state.get("time_until_submitted", False):
+        return
+
+    if simulation_mode == "Fixed return rate":
         st.session_state.expected_interest_rate = expected_interest_rate
 
         data_df = simulate_time_series(
@@ -146,26 +221,31 @@ def render_time_until_tab():
             monthly_deposit_growth,
             35,
             [expected_interest_rate] * 35,
+            start_date=date.today(),
         )
 
         plot_results(data_df)
 
-        date_exceeding = data_df[
-            data_df["Net Worth"] >= st.session_state.get("fire_objective", 0)
-        ].index.min()
+        # With non-negative rates, a non-negative starting net worth and deposits keep the net worth
+        # from decreasing; the binary search is also only used for a non-negative objective
+        fire_objective = st.session_state.get("fire_objective", 0)
+        date_exceeding = find_date_exceeding(
+            data_df,
+            fire_objective,
+            monotonic=(
+                st.session_state.current_net_worth >= 0
+                and base_monthly_investment >= 0
+                and fire_objective >= 0
+            ),
+        )
         if date_exceeding is pd.NaT:
             st.warning("Net worth will not exceed fire objective in the next 35 years.")
         else:
-            st.info(f"Net worth exceeds fire objective at: {date_exceeding}")
+            st.info(f"Net worth exceeds fire objective at: {date_exceeding:%Y-%m-%d}")
         
-        st.table(data_df)
+        st.table(data_df.set_axis(data_df.index.date))
 
     elif simulation_mode == "Monte Carlo":
-        ticker_option = st.selectbox(
-            "What index would you like to use in the simulation?",
-            ticker_mapping.keys()
-        )
-
         with st.spinner('Making some calculations...'):
             simulation_df = monte_carlo_accruing_wealth(
                 st.session_state.current_net_worth,
@@ -174,36 +254,23 @@ def render_time_until_tab():
                 100,
                 35,
                 ticker_mapping[ticker_option],
+                start_date=date.today(),
             )
+            result_avg = average_simulations(simulation_df)
 
             simulation_df = simulation_df.reset_index(names="Year")
             net_worth_df = simulation_df.drop(columns=["Interest Made", "Monthly Investment", "Monthly Investment - Cumulative Sum", "Interest Made - Cumulative Sum"])
 
-            chart = alt.Chart(net_worth_df).mark_line().encode(
-                x="Year:T",
-                y="Net Worth:Q",
-                detail="Iteration:N",
-                tooltip=["Year", "Net Worth", "Iteration"],
-                opacity=alt.value(0.2),
-            ).properties(
-                title="Monte Carlo simulation of net worth over time",
-            )
-            objective_line = (
-                alt.Chart(pd.DataFrame({"Objective": [st.session_state.get("fire_objective", 0)]}))
-                .mark_rule()
-                .encode(y="Objective:Q")
-            )
-            st.altair_chart(chart + objective_line, use_container_width=True)
+            # Yearly points are enough at this scale and keep the chart responsive. Each point is
+            # the last simulated month of its year, plotted at that month.
+            net_worth_df = net_worth_df.groupby(["Iteration", net_worth_df["Year"].dt.year]).tail(1)
 
-            result_avg = simulation_df.groupby("Year").agg({
-                "Net Worth": "mean", 
-                "Interest Made - Cumulative Sum": "mean",
-                "Monthly Investment - Cumulative Sum": "mean",
-                "Interest Made": "mean",
-                "Monthly Investment": "mean",
-            })
-        plot_results(result_avg)
-        st.table(result_avg)
+            spec = build_monte_carlo_chart_spec(net_worth_df, st.session_state.get("fire_objective", 0))
+            st.vega_lite_chart(spec, use_container_width=True)
+
+            yearly_avg = result_avg.groupby(result_avg.index.year).tail(1)
+        plot_results(yearly_avg)
+        st.table(result_avg.set_axis(result_avg.index.date))
 
 
 def render_age_tab():
@@ -265,16 +332,21 @@ def render_age_tab():
         st.session_state.get("monthly_deposit_growth", 3),
         35,
         [expected_interest_rate] * 35,
+        start_date=date.today(),
     )
 
     plot_results(data_df)
 
-    date_exceeding = data_df[
-        data_df["Net Worth"] >= fire_objective
-    ].index.min()
+    # The required monthly investment is never negative, so only the starting net worth and
+    # the objective can make the binary search unsafe
+    date_exceeding = find_date_exceeding(
+        data_df,
+        fire_objective,
+        monotonic=st.session_state.current_net_worth >= 0 and fire_objective >= 0,
+    )
     if date_exceeding is pd.NaT:
         st.warning("Net worth will not exceed fire objective in the next 35 years.")
     else:
-        st.info(f"Net worth exceeds fire objective at: {date_exceeding}")
+        st.info(f"Net worth exceeds fire objective at: {date_exceeding:%Y-%m-%d}")
 
-    st.table(data_df)
+    st.table(data_df.set_axis(data_df.index.date))
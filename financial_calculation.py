@@ -15,38 +15,6 @@ def calculate_FI_objective(
     return diff_to_compensate / (safe_withdrawal_rate / 100)
 
 
-def calculate_month_values(
-    current_amount: float,
-    yearly_interest_rate: float,
-    current_monthly_deposit_amount: float,
-    monthly_deposit_yearly_growth: float,
-) -> dict:
-    """Used to calculates monthly modifications in parameters of FI calculations
-
-    Args:
-        current_amount (float): Amount of total investment.
-        yearly_interest_rate (float): Interest rate made on investments.
-        current_monthly_deposit_amount (float): New amount added to the investment account
-            as a monthly deposit.
-        monthly_deposit_yearly_growth (float): Yearly rate at which the monthly deposit grows.
-
-    Returns:
-        dict: Returns new_amount, interest_made in the last month
-            and new_monthly_deposit.
-    """
-    new_monthly_deposit = current_monthly_deposit_amount + (
-        current_monthly_deposit_amount
-        * (monthly_deposit_yearly_growth / (12.0 * 100.0))
-    )
-    interest_made = current_amount * (yearly_interest_rate / (12.0 * 100.0))
-    new_amount = current_amount + interest_made + new_monthly_deposit
-
-    return {
-        "new_amount": new_amount, 
-        "interest_made": interest_made, 
-        "new_monthly_deposit": new_monthly_deposit,
-    }
-
 def calculate_required_monthly_investment(
         current_net_worth: float, 
         target_age: int, 
@@ -79,7 +47,13 @@ def calculate_required_monthly_investment(
         float: The monthly investment required to reach the FI objective by the target age.
     """
     months_to_target = (target_age - current_age) * 12
-    monthly_interest_rate = 1 + ((yearly_interest_rate / 100) / 12)
-    required_monthly_investment = ((fire_objective - (current_net_worth * (monthly_interest_rate ** months_to_target))) * (monthly_interest_rate - 1)) / ((monthly_interest_rate ** months_to_target) - 1)
+    monthly_interest_rate = yearly_interest_rate / 1200.0
+
+    if monthly_interest_rate == 0:
+        # Without interest, the gap is simply split evenly over the remaining months
+        required_monthly_investment = (fire_objective - current_net_worth) / months_to_target
+    else:
+        compounded_growth = (1.0 + monthly_interest_rate) ** months_to_target
+        required_monthly_investment = ((fire_objective - (current_net_worth * compounded_growth)) * monthly_interest_rate) / (compounded_growth - 1.0)
 
-    return max(required_monthly_investment, 0)
+    return max(required_monthly_investment, 0.0)
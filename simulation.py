@@ -2,19 +2,145 @@
 This module contains functions to simulate financial time series.
 """
 
-from datetime import datetime
+from datetime import date
+from pathlib import Path
 from typing import List
+import numpy as np
 import pandas as pd
-import os
-from financial_calculation import calculate_month_values
+import streamlit as st
+import numba
+from numba import njit, prange
 
+# Streamlit runs each session in its own thread, so concurrent Monte Carlo runs launch mc_kernel
+# concurrently. Refuse the workqueue threading layer, which aborts the process in that case.
+numba.config.THREADING_LAYER = "threadsafe"
 
+DATA_DIR = Path(__file__).parent / "data"
+RESULT_COLUMNS = [
+    "Net Worth",
+    "Interest Made",
+    "Monthly Investment",
+    "Monthly Investment - Cumulative Sum",
+    "Interest Made - Cumulative Sum",
+]
+
+
+# Explicit signatures compile the kernels eagerly at import (or load them from the on-disk
+# cache), so the first simulation of a session does not pay for the JIT compilation.
+@njit(
+    [
+        "void(f8, f8, f8, f8[::1], f8[:, ::1])",
+        "void(f8, f8, f8, f8[::1], f4[:, ::1])",
+    ],
+    fastmath=True,
+    cache=True,
+)
+def sim_kernel(
+    net_worth: float,
+    base_monthly_deposit: float,
+    monthly_deposit_yearly_growth: float,
+    returns_per_year: np.ndarray,
+    out: np.ndarray,
+) -> None:
+    """
+    Runs the month-by-month recurrence of the simulation in native code.
+
+    Args:
+        net_worth (float): Starting net worth.
+        base_monthly_deposit (float): Initial monthly deposit.
+        monthly_deposit_yearly_growth (float): Yearly growth of monthly deposits (in %).
+        returns_per_year (np.ndarray): Return (in %) applied to each simulated year.
+        out (np.ndarray): Array of shape (months, 5) filled with the net worth, interest made,
+            monthly deposit and cumulative sums of the deposits and interests of each month.
+    """
+    deposit_growth = monthly_deposit_yearly_growth / 1200.0
+    current_net_worth = net_worth
+    current_deposit = base_monthly_deposit
+    deposits_sum = 0.0
+    interests_sum = 0.0
+    month = 0
+    for year in range(returns_per_year.shape[0]):
+        monthly_rate = returns_per_year[year] / 1200.0
+        for _ in range(12):
+            current_deposit += current_deposit * deposit_growth
+            interest = current_net_worth * monthly_rate
+            current_net_worth += interest + current_deposit
+            deposits_sum += current_deposit
+            interests_sum += interest
+
+            out[month, 0] = current_net_worth
+            out[month, 1] = interest
+            out[month, 2] = current_deposit
+            out[month, 3] = deposits_sum
+            out[month, 4] = interests_sum
+            month += 1
+
+
+@njit("void(f8, f8, f8, f8[:, ::1], f4[:, :, ::1])", parallel=True, cache=True)
+def mc_kernel(
+    net_worth: float,
+    base_monthly_deposit: float,
+    monthly_deposit_yearly_growth: float,
+    returns_matrix: np.ndarray,
+    out: np.ndarray,
+) -> None:
+    """
+    Runs every Monte Carlo simulation in parallel, one row of returns per simulation.
+
+    Args:
+        net_worth (float): Starting net worth.
+        base_monthly_deposit (float): Initial monthly deposit.
+        monthly_deposit_yearly_growth (float): Yearly growth of monthly deposits (in %).
+        returns_matrix (np.ndarray): Array of shape (simulations, years) of yearly returns (in %).
+        out (np.ndarray): Array of shape (simulations, months, 5) filled by the simulations.
+    """
+    for simulation in prange(returns_matrix.shape[0]):
+        sim_kernel(
+            net_worth,
+            base_monthly_deposit,
+            monthly_deposit_yearly_growth,
+            returns_matrix[simulation],
+            out[simulation],
+        )
+
+
+def build_month_index(start_date: date, months: int) -> pd.DatetimeIndex:
+    """
+    Builds the index of the simulated months, starting on the first month start on or after start_date.
+
+    Args:
+        start_date (date): Date the simulation starts from.
+        months (int): Number of months simulated.
+
+    Returns:
+        pd.DatetimeIndex: Month start dates, at midnight, of the simulated months.
+    """
+    return pd.date_range(start=pd.Timestamp(start_date), periods=months, freq="MS")
+
+
+@st.cache_data
+def load_historical_returns(ticker_file: str) -> np.ndarray:
+    """
+    Loads the yearly historical returns of an index, cached across Streamlit reruns.
+
+    Args:
+        ticker_file (str): File containing historical returns data.
+
+    Returns:
+        np.ndarray: Yearly returns (in %) of the index.
+    """
+    return pd.read_csv(DATA_DIR / ticker_file)["value"].to_numpy(dtype=np.float64)
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
 def simulate_time_series(
     net_worth: float,
     base_monthly_deposit: float,
     monthly_deposit_yearly_growth: float,
     years: int = 35,
     historical_returns: List[float] = None,
+    *,
+    start_date: date,
 ) -> pd.DataFrame:
     """
     Simulates the financial time series based on net worth, deposits, and growth rates.
@@ -26,40 +152,37 @@ def simulate_time_series(
         monthly_deposit_yearly_growth (float): Yearly growth of monthly deposits (as a decimal).
         years (int, optional): Horizon for the simulation in years. Defaults to 35.
         historical_returns (List[float], optional): List of historical returns for each year.
+        start_date (date): Date the simulation starts from. Passed explicitly, rather than read
+            from the clock, so that it is part of the cache key.
 
     Returns:
         pd.DataFrame: DataFrame containing the financial time series.
+
+    Raises:
+        ValueError: If fewer historical returns than years are provided.
     """
-    # Initialize variables
-    current_net_worth = net_worth
-    current_monthly_deposit = base_monthly_deposit
     historical_returns = historical_returns or [7] * years
+    if len(historical_returns) < years:
+        raise ValueError(
+            f"{years} years were requested but only {len(historical_returns)} yearly returns were provided."
+        )
 
-    data = []
-    for year in range(years):
-        yearly_interest_rate = historical_returns[year]
-        
-        for _ in range(12):
-            current_val = calculate_month_values(
-                current_net_worth,
-                yearly_interest_rate,
-                current_monthly_deposit,
-                monthly_deposit_yearly_growth,
-            )
-            current_net_worth = current_val["new_amount"]
-            current_monthly_deposit = current_val["new_monthly_deposit"]
-            data.append([current_net_worth, current_val["interest_made"], current_monthly_deposit])
-
-    dates = pd.date_range(start=datetime.now(), periods=years * 12, freq="MS")
-    df = pd.DataFrame(data, index=dates, columns=["Net Worth", "Interest Made", "Monthly Investment"])
-
-    df["Monthly Investment - Cumulative Sum"] = df["Monthly Investment"].cumsum()
-    df["Interest Made - Cumulative Sum"] = df["Interest Made"].cumsum()
-    df.index = df.index.date
+    values = np.empty((years * 12, 5))
+    sim_kernel(
+        net_worth,
+        base_monthly_deposit,
+        monthly_deposit_yearly_growth,
+        np.asarray(historical_returns[:years], dtype=np.float64),
+        values,
+    )
+
+    dates = build_month_index(start_date, years * 12)
+    df = pd.DataFrame(values, index=dates, columns=RESULT_COLUMNS)
 
     return df
 
 
+@st.cache_data(max_entries=32, show_spinner=False)
 def monte_carlo_accruing_wealth(
     current_net_worth: float,
     base_monthly_investment: float,
@@ -67,6 +190,9 @@ def monte_carlo_accruing_wealth(
     simulations: int = 1000,
     years: int = 35,
     ticker_file: str = "sp-500-historical-annual-returns.csv",
+    seed: int = 0,
+    *,
+    start_date: date,
 ) -> pd.DataFrame:
     """
     Simulates accruing wealth over 35 years on a monthly basis using a Monte Carlo approach.
@@ -78,27 +204,72 @@ def monte_carlo_accruing_wealth(
         simulations (int): Number of Monte Carlo simulations to run.
         years (int): Number of years to simulate.
         ticker_file (str): File containing historical returns data.
+        seed (int): Seed of the random generator used to sample the yearly returns.
+        start_date (date): Date the simulation starts from, part of the cache key.
 
     Returns:
         pd.DataFrame: A DataFrame with columns "Net Worth", "Interest Made", "Monthly Investment",
                       "Monthly Investment - Cumulative Sum", and "Interest Made - Cumulative Sum"
+
+    Raises:
+        ValueError: If the historical returns cover fewer years than requested.
     """
-    historical_returns = pd.read_csv(f"{os.getcwd()}/data/{ticker_file}")
-
-    # Storage for simulation results
-    simulation_results = [
-        simulate_time_series(
-            current_net_worth,
-            base_monthly_investment,
-            monthly_deposit_growth,
-            years,
-            historical_returns.sample(n=years)["value"].to_list(),
-        ) for _ in range(simulations)
-    ]
-    
-    # Combine all simulation results
-    for i, df in enumerate(simulation_results):
-        df['Iteration'] = i
-    combined_results = pd.concat(simulation_results, ignore_index=False)
+    historical_returns = load_historical_returns(ticker_file)
+    if len(historical_returns) < years:
+        raise ValueError(
+            f"{years} years were requested but {ticker_file} only has {len(historical_returns)} yearly returns."
+        )
+
+    rng = np.random.default_rng(seed)
+
+    # Each row is an independent shuffle of the history, i.e. years drawn without replacement
+    returns_matrix = np.ascontiguousarray(
+        rng.permuted(
+            np.broadcast_to(historical_returns, (simulations, len(historical_returns))), axis=1
+        )[:, :years]
+    )
+
+    months = years * 12
+    # Stored as float32 to halve the memory moved around, the kernel still computes in float64
+    values = np.empty((simulations, months, 5), dtype=np.float32)
+    mc_kernel(
+        current_net_worth,
+        base_monthly_investment,
+        monthly_deposit_growth,
+        returns_matrix,
+        values,
+    )
+
+    # Combine all simulation results, sharing one index of dates
+    dates = build_month_index(start_date, months)
+    combined_results = pd.DataFrame(
+        values.reshape(simulations * months, 5),
+        index=pd.DatetimeIndex(np.tile(dates, simulations)),
+        columns=RESULT_COLUMNS,
+    )
+    combined_results["Iteration"] = np.repeat(np.arange(simulations), months)
 
     return combined_results
+
+
+def average_simulations(simulation_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Averages the Monte Carlo simulations month by month.
+
+    The rows of every iteration are aligned by construction, so the average is taken over the
+    simulation axis of the reshaped values rather than through a groupby on the dates.
+
+    Args:
+        simulation_df (pd.DataFrame): Results of monte_carlo_accruing_wealth.
+
+    Returns:
+        pd.DataFrame: The average of each column in RESULT_COLUMNS for each month.
+    """
+    simulations = simulation_df["Iteration"].iat[-1] + 1
+    values = simulation_df[RESULT_COLUMNS].to_numpy().reshape(simulations, -1, len(RESULT_COLUMNS))
+
+    return pd.DataFrame(
+        values.mean(axis=0, dtype=np.float64),
+        index=simulation_df.index[:values.shape[1]],
+        columns=RESULT_COLUMNS,
+    )